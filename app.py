@@ -1,13 +1,23 @@
 import streamlit as st
 import requests
 from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
-import overpy
+from geopy.extra.rate_limiter import RateLimiter
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+import orjson
 import folium
+from folium.plugins import FastMarkerCluster
 from streamlit_folium import folium_static
 import time
+import numpy as np
 import pandas as pd
 import random
+import re
+import hashlib
+import html
+import os
+import string
+import unicodedata
+import diskcache
 
 # Page configuration
 st.set_page_config(
@@ -23,41 +33,102 @@ This app helps you find the best restaurants based on your preferences using int
 Enter your preferences to get personalized restaurant suggestions and local dish recommendations!
 """)
 
+# On-disk cache for geocoding and Overpass results
+CACHE_DIR = "./app_cache"
+GEOCODE_CACHE_TTL = 30 * 24 * 60 * 60  # seconds
+GEOCODE_NOT_FOUND_TTL = 60 * 60  # seconds; unknown places may be added to OSM or found on retry
+OVERPASS_CACHE_TTL = 24 * 60 * 60  # seconds
+
+# Overpass endpoint; set OVERPASS_API_URL to use a different mirror
+OVERPASS_URL = os.environ.get("OVERPASS_API_URL", "https://overpass-api.de/api/interpreter")
+OVERPASS_QUERY_TEMPLATE = string.Template(
+    "[out:json][timeout:25];($statements);out body;"
+)
+
+# HTTP status codes from Overpass that are worth retrying
+OVERPASS_RETRY_STATUSES = {429, 502, 503, 504}
+
 # Initialize APIs
-geolocator = Nominatim(user_agent="restaurant_recommendation_app")
-overpass_api = overpy.Overpass()
+@st.cache_resource
+def get_geolocator():
+    """Create the Nominatim client once and share it across reruns and sessions"""
+    return Nominatim(user_agent="restaurant_recommendation_app")
+
+@st.cache_resource
+def get_geocoder():
+    """Wrap geocoding in a shared rate limiter that retries transient failures"""
+    return RateLimiter(
+        get_geolocator().geocode,
+        min_delay_seconds=1,
+        max_retries=2,
+        error_wait_seconds=2.0,
+        swallow_exceptions=False
+    )
+
+@st.cache_resource
+def get_disk_cache():
+    """Open the persistent on-disk cache once; it is safe to share across threads"""
+    return diskcache.Cache(CACHE_DIR)
+
+@st.cache_resource
+def get_http_session():
+    """Create a keep-alive HTTP session reused for all Overpass requests"""
+    return requests.Session()
+
+geocode = get_geocoder()
+
+# OSM address tags, in display order
+ADDRESS_KEYS = ('addr:housenumber', 'addr:street', 'addr:city', 'addr:postcode')
+
+# Leaflet callback turning a [lat, lon, popup, tooltip] row into a restaurant marker;
+# popup and tooltip are inserted as HTML, so they must be escaped beforehand
+RESTAURANT_MARKER_CALLBACK = """
+function (row) {
+    var icon = L.AwesomeMarkers.icon({icon: 'cutlery', prefix: 'fa', markerColor: 'blue'});
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup(row[2]);
+    marker.bindTooltip(row[3]);
+    return marker;
+}
+"""
+
+# Mean Earth radius used for distance calculations
+EARTH_RADIUS_KM = 6371.0088
 
 # Cuisine data (mapping of cuisines to common dishes)
 CUISINE_DISHES = {
-    "north_indian": ["Butter Chicken", "Tandoori Roti", "Paneer Tikka", "Dal Makhani", "Naan", "Chole Bhature"],
-    "south_indian": ["Dosa", "Idli", "Vada", "Sambar", "Rasam", "Appam", "Pongal"],
-    "chinese": ["Dim Sum", "Kung Pao Chicken", "Fried Rice", "Hakka Noodles", "Manchurian"],
-    "italian": ["Pizza", "Pasta", "Risotto", "Lasagna", "Tiramisu"],
-    "mexican": ["Tacos", "Burritos", "Quesadillas", "Guacamole"],
-    "japanese": ["Sushi", "Ramen", "Tempura", "Udon"],
-    "thai": ["Pad Thai", "Green Curry", "Tom Yum Soup", "Mango Sticky Rice"],
-    "street_food": ["Golgappa/Pani Puri", "Vada Pav", "Bhel Puri", "Pav Bhaji", "Chole Kulche"],
-    "bengali": ["Mishti Doi", "Rasgulla", "Sandesh", "Fish Curry", "Kosha Mangsho"],
-    "gujarati": ["Dhokla", "Thepla", "Khandvi", "Fafda", "Undhiyu"],
-    "punjabi": ["Sarson Da Saag", "Makki Di Roti", "Amritsari Fish", "Butter Chicken", "Lassi"],
-    "seafood": ["Fish Curry", "Prawn Masala", "Crab Roast", "Fish Fry"],
-    "vegetarian": ["Paneer Dishes", "Dal Tadka", "Gobi Manchurian", "Vegetable Biryani"],
-    "vegan": ["Vegetable Curry", "Tofu Dishes", "Falafel"],
-    "fast_food": ["Burgers", "Pizza", "Fries", "Sandwiches"]
+    "north_indian": ("Butter Chicken", "Tandoori Roti", "Paneer Tikka", "Dal Makhani", "Naan", "Chole Bhature"),
+    "south_indian": ("Dosa", "Idli", "Vada", "Sambar", "Rasam", "Appam", "Pongal"),
+    "chinese": ("Dim Sum", "Kung Pao Chicken", "Fried Rice", "Hakka Noodles", "Manchurian"),
+    "italian": ("Pizza", "Pasta", "Risotto", "Lasagna", "Tiramisu"),
+    "mexican": ("Tacos", "Burritos", "Quesadillas", "Guacamole"),
+    "japanese": ("Sushi", "Ramen", "Tempura", "Udon"),
+    "thai": ("Pad Thai", "Green Curry", "Tom Yum Soup", "Mango Sticky Rice"),
+    "street_food": ("Golgappa/Pani Puri", "Vada Pav", "Bhel Puri", "Pav Bhaji", "Chole Kulche"),
+    "bengali": ("Mishti Doi", "Rasgulla", "Sandesh", "Fish Curry", "Kosha Mangsho"),
+    "gujarati": ("Dhokla", "Thepla", "Khandvi", "Fafda", "Undhiyu"),
+    "punjabi": ("Sarson Da Saag", "Makki Di Roti", "Amritsari Fish", "Butter Chicken", "Lassi"),
+    "seafood": ("Fish Curry", "Prawn Masala", "Crab Roast", "Fish Fry"),
+    "vegetarian": ("Paneer Dishes", "Dal Tadka", "Gobi Manchurian", "Vegetable Biryani"),
+    "vegan": ("Vegetable Curry", "Tofu Dishes", "Falafel"),
+    "fast_food": ("Burgers", "Pizza", "Fries", "Sandwiches")
 }
 
 # Region-specific dishes
 REGIONAL_DISHES = {
-    "delhi": ["Chole Bhature", "Paranthas", "Butter Chicken", "Chaat", "Kebabs"],
-    "mumbai": ["Vada Pav", "Pav Bhaji", "Bhel Puri", "Bombay Sandwich"],
-    "bangalore": ["Dosa", "Idli Vada", "Filter Coffee", "Bisi Bele Bath"],
-    "kolkata": ["Rasgulla", "Sandesh", "Kathi Rolls", "Fish Curry", "Phuchka"],
-    "chennai": ["Idli", "Dosa", "Filter Coffee", "Chettinad Cuisine"],
-    "hyderabad": ["Hyderabadi Biryani", "Haleem", "Irani Chai", "Osmania Biscuits"],
-    "jaipur": ["Dal Baati Churma", "Pyaaz Kachori", "Ghewar", "Laal Maas"],
-    "lucknow": ["Tunday Kebabs", "Lucknowi Biryani", "Basket Chaat", "Sheermal"]
+    "delhi": ("Chole Bhature", "Paranthas", "Butter Chicken", "Chaat", "Kebabs"),
+    "mumbai": ("Vada Pav", "Pav Bhaji", "Bhel Puri", "Bombay Sandwich"),
+    "bangalore": ("Dosa", "Idli Vada", "Filter Coffee", "Bisi Bele Bath"),
+    "kolkata": ("Rasgulla", "Sandesh", "Kathi Rolls", "Fish Curry", "Phuchka"),
+    "chennai": ("Idli", "Dosa", "Filter Coffee", "Chettinad Cuisine"),
+    "hyderabad": ("Hyderabadi Biryani", "Haleem", "Irani Chai", "Osmania Biscuits"),
+    "jaipur": ("Dal Baati Churma", "Pyaaz Kachori", "Ghewar", "Laal Maas"),
+    "lucknow": ("Tunday Kebabs", "Lucknowi Biryani", "Basket Chaat", "Sheermal")
 }
 
+# Matches any known region name in a single pass over the location string
+REGION_PATTERN = re.compile("|".join(re.escape(region) for region in REGIONAL_DISHES))
+
 # Form for user preferences
 with st.form("recommendation_form"):
     col1, col2 = st.columns(2)
@@ -136,37 +207,78 @@ def get_dietary_filter(dietary_restrictions):
     
     return filters
 
-def extract_restaurant_details(element):
+def build_base_map(latitude, longitude):
+    """Create a map centered on the search location with its marker"""
+    m = folium.Map(
+        location=[latitude, longitude],
+        zoom_start=14
+    )
+    
+    # Add marker for search location
+    folium.Marker(
+        [latitude, longitude],
+        popup="Search Location",
+        icon=folium.Icon(color='red', icon='home')
+    ).add_to(m)
+    
+    return m
+
+def build_amenity_statements(amenity_filters, around):
+    """Build Overpass statements for named nodes, merging amenities that share the same filters"""
+    grouped = {}
+    for amenity, filters in amenity_filters.items():
+        grouped.setdefault(filters, []).append(amenity)
+    
+    statements = []
+    for filters, amenities in grouped.items():
+        if len(amenities) == 1:
+            amenity_filter = f'["amenity"="{amenities[0]}"]'
+        else:
+            amenity_filter = f'["amenity"~"^({"|".join(amenities)})$"]'
+        statements.append(f'node{amenity_filter}["name"]{around}{filters};')
+    
+    return statements
+
+def get_rating(element):
+    """Get a restaurant's star rating from its OSM tags"""
+    tags = element.get('tags', {})
+    stars = int(float(tags.get('stars', '0')) * 5) if 'stars' in tags else None
+    
+    # Derive a stable rating from the OSM id if not available (3.5 to 4.9)
+    if not stars:
+        stars = round(3.5 + (element['id'] & 0x3FFF) / 0x3FFF * 1.4, 1)
+    
+    return stars
+
+def tokenize(text):
+    """Split text into lowercased words, ignoring punctuation such as ';' and ','"""
+    return re.findall(r'\w+', text.lower())
+
+def matches_preferences(element, pref_tokens):
+    """Check whether any word in an element's tag values is a preference keyword"""
+    return any(
+        not pref_tokens.isdisjoint(tokenize(str(value)))
+        for value in element.get('tags', {}).values()
+    )
+
+def extract_restaurant_details(element, stars, distance):
     """Extract restaurant details from OSM element"""
-    tags = element.tags
+    tags = element.get('tags', {})
     
     # Basic information
     name = tags.get('name', 'Unnamed Restaurant')
     cuisine = tags.get('cuisine', '').replace(';', ', ').title()
     
     # Address construction
-    address_parts = []
-    if tags.get('addr:housenumber'):
-        address_parts.append(tags.get('addr:housenumber'))
-    if tags.get('addr:street'):
-        address_parts.append(tags.get('addr:street'))
-    if tags.get('addr:city'):
-        address_parts.append(tags.get('addr:city'))
-    if tags.get('addr:postcode'):
-        address_parts.append(tags.get('addr:postcode'))
-    
-    address = ", ".join(address_parts) if address_parts else "Address not available"
+    address = ", ".join(
+        value for key in ADDRESS_KEYS if (value := tags.get(key))
+    ) or "Address not available"
     
     # Other details
-    phone = tags.get('phone', tags.get('contact:phone', 'Not available'))
-    website = tags.get('website', tags.get('contact:website', ''))
+    phone = tags.get('phone') or tags.get('contact:phone') or 'Not available'
+    website = tags.get('website') or tags.get('contact:website') or ''
     opening_hours = tags.get('opening_hours', 'Hours not available')
     price_range = tags.get('price_range', '')
-    stars = int(float(tags.get('stars', '0')) * 5) if 'stars' in tags else None
-    
-    # Generate a rating if not available (3.5 to 4.9)
-    if not stars:
-        stars = round(random.uniform(3.5, 4.9), 1)
     
     # For UI display
     price_symbols = "₹" * (int(price_range) if price_range else 2)
@@ -182,151 +294,242 @@ def extract_restaurant_details(element):
         'price_display': price_symbols,
         'stars': stars,
         'rating': f"{stars}/5" if stars else "Not rated",
-        'lat': float(element.lat),
-        'lon': float(element.lon)
+        'lat': element['lat'],
+        'lon': element['lon'],
+        'distance': distance
     }
 
+def normalize_location(location_name):
+    """Normalize a location string into a cache key so equivalent inputs share an entry"""
+    text = unicodedata.normalize('NFKC', location_name).casefold()
+    # Only punctuation is dropped; vowel signs and other marks are part of the word
+    text = ''.join(' ' if unicodedata.category(ch).startswith('P') else ch for ch in text)
+    return ' '.join(text.split())
+
+def geocode_location(location_name):
+    """Return (latitude, longitude) for a location, or None if not found"""
+    cache = get_disk_cache()
+    key = ('geocode', normalize_location(location_name))
+    coordinates = cache.get(key, default=diskcache.ENOVAL)
+    if coordinates is not diskcache.ENOVAL:
+        return coordinates
+    
+    # Geocode what the user typed; the normalized form is only the cache key
+    location_data = geocode(location_name.strip())
+    coordinates = (location_data.latitude, location_data.longitude) if location_data else None
+    cache.set(key, coordinates, expire=GEOCODE_CACHE_TTL if coordinates else GEOCODE_NOT_FOUND_TTL)
+    return coordinates
+
+def haversine_km(lat0, lon0, lats, lons):
+    """Vectorized great-circle distance in km from one point to arrays of points"""
+    lat0, lon0 = np.radians(lat0), np.radians(lon0)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+class OverpassRuntimeError(Exception):
+    """Overpass answered, but reported that the query failed (e.g. timeout or out of memory)"""
+
+def _is_transient_overpass_error(exc):
+    """Whether an Overpass request failure is likely to succeed on retry"""
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout, OverpassRuntimeError)):
+        return True
+    return (
+        isinstance(exc, requests.HTTPError)
+        and exc.response is not None
+        and exc.response.status_code in OVERPASS_RETRY_STATUSES
+    )
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_random_exponential(min=1, max=8),
+    retry=retry_if_exception(_is_transient_overpass_error),
+    reraise=True
+)
+def fetch_overpass(query):
+    """POST a query to Overpass and return the parsed JSON response"""
+    response = get_http_session().post(OVERPASS_URL, data={'data': query}, timeout=60)
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+    
+    # Failed queries still return HTTP 200, with a remark and empty or partial elements
+    remark = data.get('remark', '')
+    if remark.startswith('runtime error'):
+        raise OverpassRuntimeError(remark)
+    return data
+
+def _cached_overpass(query):
+    """Run an Overpass query, serving repeat queries from the on-disk cache"""
+    # Collapse whitespace so equivalent queries share a cache entry
+    query = ' '.join(query.split())
+    key = ('overpass', hashlib.blake2b(query.encode('utf-8'), digest_size=16).hexdigest())
+    cache = get_disk_cache()
+    elements = cache.get(key)
+    if elements is not None:
+        return elements
+    
+    elements = [
+        element for element in fetch_overpass(query)['elements']
+        if element['type'] == 'node'
+    ]
+    
+    cache.set(key, elements, expire=OVERPASS_CACHE_TTL)
+    return elements
+
+def _pick(dishes, k, seed):
+    """Deterministically choose up to k dishes for a given string seed"""
+    if not dishes:
+        return []
+    return random.Random(seed).sample(dishes, min(k, len(dishes)))
+
+@st.cache_data(show_spinner=False)
 def recommend_local_dishes(cuisine_type, location_name):
     """Recommend local dishes based on cuisine type and location"""
     # Default to empty list
     dishes = []
     
-    # Get cuisine-specific dishes
+    # Seed selections by the inputs so the same search shows the same dishes
     cuisine_key = get_cuisine_tag(cuisine_type)
+    location_lower = location_name.lower()
+    seed = f"{cuisine_key}|{location_lower}"
+    
+    # Get cuisine-specific dishes
     if cuisine_key in CUISINE_DISHES:
-        dishes.extend(random.sample(CUISINE_DISHES[cuisine_key], min(2, len(CUISINE_DISHES[cuisine_key]))))
+        dishes.extend(_pick(CUISINE_DISHES[cuisine_key], 2, seed))
     
     # Add regional dishes if location is in our database
-    location_lower = location_name.lower()
-    for region, region_dishes in REGIONAL_DISHES.items():
-        if region in location_lower:
-            dishes.extend(random.sample(REGIONAL_DISHES[region], min(2, len(REGIONAL_DISHES[region]))))
-            break
+    region_match = REGION_PATTERN.search(location_lower)
+    if region_match:
+        dishes.extend(_pick(REGIONAL_DISHES[region_match.group()], 2, seed))
     
     # If we still don't have dishes, add some general recommendations
     if not dishes and cuisine_key != "any":
         for cuisine, cuisine_dishes in CUISINE_DISHES.items():
-            dishes.extend(random.sample(cuisine_dishes, 1))
+            dishes.extend(_pick(cuisine_dishes, 1, f"{seed}|{cuisine}"))
             if len(dishes) >= 3:
                 break
     
     return dishes[:3]  # Return at most 3 dishes
 
+@st.cache_data(ttl=600, show_spinner=False)
+def compute_recommendations(location, cuisine_type, budget_range, dietary_restrictions,
+                            radius_km, num_recommendations, additional_preferences):
+    """Geocode, query and rank restaurants, returning (latitude, longitude, restaurants)
+    
+    Returns None if the location could not be geocoded.
+    """
+    # Geocode the location
+    coordinates = geocode_location(location)
+    if not coordinates:
+        return None
+    latitude, longitude = coordinates
+    
+    # Build Overpass query
+    cuisine_tag = get_cuisine_tag(cuisine_type)
+    dietary_filters = get_dietary_filter(dietary_restrictions)
+    budget_tag = get_budget_tag(budget_range)
+    
+    # Round to ~100m so small changes in the geocoded point reuse cached results
+    query_lat = round(latitude, 3)
+    query_lon = round(longitude, 3)
+    
+    # Filters applied to each amenity type
+    dietary_query = ''.join(dietary_filters)
+    restaurant_filters = dietary_query
+    
+    # Add cuisine filter if specified
+    if cuisine_tag:
+        restaurant_filters = f'["cuisine"~"{cuisine_tag}"]' + restaurant_filters
+    
+    # Add budget filter if applicable
+    if budget_tag:
+        restaurant_filters += f'["price_range"="{budget_tag}"]'
+    
+    amenity_filters = {
+        'restaurant': restaurant_filters,
+        'cafe': dietary_query
+    }
+    
+    # Add fast food search if budget is low
+    if budget_range == "Budget (<₹300)":
+        amenity_filters['fast_food'] = ''
+    
+    query_parts = build_amenity_statements(
+        amenity_filters,
+        f"(around:{radius_km * 1000},{query_lat},{query_lon})"
+    )
+    
+    # Complete the query
+    overpass_query = OVERPASS_QUERY_TEMPLATE.substitute(
+        statements=''.join(query_parts)
+    )
+    
+    # Execute Overpass query; it only returns named places
+    places = _cached_overpass(overpass_query)
+    
+    # Tabulate results, one row per place
+    ratings = [get_rating(p) for p in places]
+    df = pd.DataFrame({
+        'lat': [p['lat'] for p in places],
+        'lon': [p['lon'] for p in places],
+        'stars': ratings
+    }, dtype=np.float64)
+    
+    # Calculate distances from search location in one batch
+    df['distance'] = haversine_km(latitude, longitude, df['lat'].to_numpy(), df['lon'].to_numpy())
+    
+    # Rank by a combination of distance and rating
+    # Weighted score: rating matters more than distance
+    df['score'] = -df['stars'] + (df['distance'] * 0.1)
+    
+    candidates = df
+    
+    # Filter based on additional preferences if provided
+    pref_tokens = frozenset(tokenize(additional_preferences))
+    if pref_tokens:
+        # Keep places whose tag values share a keyword with the preferences
+        matches = np.fromiter(
+            (matches_preferences(p, pref_tokens) for p in places),
+            dtype=bool,
+            count=len(places)
+        )
+        
+        # If we have results after filtering, use them; otherwise, keep original results
+        if matches.any():
+            candidates = df[matches]
+    
+    top = candidates.nsmallest(num_recommendations, 'score')
+    
+    # Only build display details for the places that will be shown
+    restaurants = [
+        extract_restaurant_details(places[row.Index], ratings[row.Index], float(row.distance))
+        for row in top.itertuples()
+    ]
+    
+    return latitude, longitude, restaurants
+
 # Process form submission
 if submitted and location:
     try:
-        with st.spinner('Finding your location...'):
-            # Geocode the location
-            location_data = geolocator.geocode(location)
-            if not location_data:
-                st.error("Location not found. Please try a different location.")
-                st.stop()
-            
-            # Create map centered on the search location
-            m = folium.Map(
-                location=[location_data.latitude, location_data.longitude],
-                zoom_start=14
-            )
-            
-            # Add marker for search location
-            folium.Marker(
-                [location_data.latitude, location_data.longitude],
-                popup="Search Location",
-                icon=folium.Icon(color='red', icon='home')
-            ).add_to(m)
-            
-            # Build Overpass query
-            cuisine_tag = get_cuisine_tag(cuisine_type)
-            dietary_filters = get_dietary_filter(dietary_restrictions)
-            budget_tag = get_budget_tag(budget_range)
-            
-            # Start building the query
-            query_parts = []
-            
-            # Base restaurant search
-            restaurant_query = f'node["amenity"="restaurant"](around:{radius_km * 1000},{location_data.latitude},{location_data.longitude})'
-            
-            # Add cuisine filter if specified
-            if cuisine_tag:
-                restaurant_query += f'["cuisine"~"{cuisine_tag}"]'
-            
-            # Add dietary filters if specified
-            for dietary_filter in dietary_filters:
-                restaurant_query += dietary_filter
-            
-            # Add budget filter if applicable
-            if budget_tag:
-                restaurant_query += f'["price_range"="{budget_tag}"]'
-            
-            query_parts.append(restaurant_query + ";")
-            
-            # Also search for cafes if applicable
-            cafe_query = f'node["amenity"="cafe"](around:{radius_km * 1000},{location_data.latitude},{location_data.longitude})'
-            
-            # Add dietary filters for cafes too
-            for dietary_filter in dietary_filters:
-                cafe_query += dietary_filter
-                
-            query_parts.append(cafe_query + ";")
-            
-            # Add fast food search if budget is low
-            if budget_range == "Budget (<₹300)":
-                fast_food_query = f'node["amenity"="fast_food"](around:{radius_km * 1000},{location_data.latitude},{location_data.longitude});'
-                query_parts.append(fast_food_query)
-            
-            # Complete the query
-            overpass_query = f"""
-            [out:json][timeout:25];
-            (
-                {''.join(query_parts)}
-            );
-            out body;
-            >;
-            out skel qt;
-            """
-
         with st.spinner('Finding the best restaurants for you...'):
-            # Execute Overpass query
-            result = overpass_api.query(overpass_query)
-            
-            # Process results
-            restaurants = []
-            for node in result.nodes:
-                if 'name' in node.tags and (node.tags.get('amenity') in ['restaurant', 'cafe', 'fast_food']):
-                    restaurant = extract_restaurant_details(node)
-                    # Calculate distance from search location
-                    distance = geodesic(
-                        (location_data.latitude, location_data.longitude),
-                        (restaurant['lat'], restaurant['lon'])
-                    ).kilometers
-                    restaurant['distance'] = distance
-                    restaurants.append(restaurant)
-            
-            # Filter based on additional preferences if provided
-            if additional_preferences:
-                preferences_lower = additional_preferences.lower()
-                filtered_restaurants = []
-                for restaurant in restaurants:
-                    # Check if any preference keywords match in the restaurant tags
-                    if any(pref in str(restaurant).lower() for pref in preferences_lower.split()):
-                        filtered_restaurants.append(restaurant)
-                
-                # If we have results after filtering, use them; otherwise, keep original results
-                if filtered_restaurants:
-                    restaurants = filtered_restaurants
-
-            # Sort by a combination of distance and rating (if available)
-            def sort_key(r):
-                rating_factor = float(r.get('stars', 3.5))  # Default to 3.5 if not rated
-                distance_factor = r['distance']
-                # Weighted score: rating matters more than distance
-                return -rating_factor + (distance_factor * 0.1)
-                
-            restaurants.sort(key=sort_key)
-            
-            # Limit to requested number of recommendations
-            restaurants = restaurants[:num_recommendations]
-            
+            recommendations = compute_recommendations(
+                location,
+                cuisine_type,
+                budget_range,
+                tuple(dietary_restrictions),
+                radius_km,
+                num_recommendations,
+                additional_preferences
+            )
+        
+        if recommendations is None:
+            st.error("Location not found. Please try a different location.")
+            st.stop()
+        latitude, longitude, restaurants = recommendations
+        
+        # Create map centered on the search location
+        m = build_base_map(latitude, longitude)
+        
         # Display results
         if restaurants:
             # Get local dish recommendations
@@ -341,13 +544,19 @@ if submitted and location:
                         st.markdown(f"**{dish}**")
             
             # Display map with restaurant locations
-            for restaurant in restaurants:
-                folium.Marker(
-                    [restaurant['lat'], restaurant['lon']],
-                    popup=f"{restaurant['name']} - {restaurant.get('rating', 'No rating')}",
-                    tooltip=restaurant['name'],
-                    icon=folium.Icon(color='blue', icon='cutlery', prefix='fa')
-                ).add_to(m)
+            FastMarkerCluster(
+                [
+                    [
+                        restaurant['lat'],
+                        restaurant['lon'],
+                        html.escape(f"{restaurant['name']} - {restaurant.get('rating', 'No rating')}"),
+                        html.escape(restaurant['name'])
+                    ]
+                    for restaurant in restaurants
+                ],
+                callback=RESTAURANT_MARKER_CALLBACK,
+                options={'disableClusteringAtZoom': 14}
+            ).add_to(m)
             
             st.subheader("📍 Interactive Map:")
             folium_static(m)